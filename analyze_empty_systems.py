@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
-import sqlite3
+from itertools import groupby
+from operator import itemgetter
 
-conn = sqlite3.connect('TotalSystem.AstroDB')
+from astrodb import STAR_SYSTEMS_CTE, open_db, warn_missing_indexes
+
+conn = open_db('TotalSystem.AstroDB')
+warn_missing_indexes(conn)
 c = conn.cursor()
 
 print("\n=== ANALYZING EMPTY STAR CONTAINERS ===\n")
@@ -16,36 +20,45 @@ c.execute("""
 """)
 
 empty_systems = c.fetchall()
+sys_ids = [row[0] for row in empty_systems]
+placeholders = ','.join('?' * len(sys_ids))
+
+# Check for ANY bodies that reference these systems, one query for all of them
+c.execute(f"""
+    SELECT system_id,
+           COUNT(*),
+           COUNT(DISTINCT parent_id) as unique_parents,
+           GROUP_CONCAT(DISTINCT body_type)
+    FROM bodies
+    WHERE system_id IN ({placeholders})
+    GROUP BY system_id
+""", sys_ids)
+system_stats = {row[0]: row[1:] for row in c.fetchall()}
+
+# Fetch the bodies of every listed system at once and bucket them by system
+c.execute(f"""
+    SELECT system_id, id, name, parent_id, body_type, spectral
+    FROM bodies
+    WHERE system_id IN ({placeholders})
+    ORDER BY system_id, parent_id, name
+""", sys_ids)
+system_bodies = {
+    system_id: [row[1:] for row in rows]
+    for system_id, rows in groupby(c.fetchall(), key=itemgetter(0))
+}
 
 for sys_id, name, x, y, z in empty_systems:
     print(f"\nEmpty Container: {name} (ID: {sys_id})")
     print(f"  Position: ({x}, {y}, {z})")
 
-    # Check for ANY bodies that reference this system
-    c.execute("""
-        SELECT COUNT(*),
-               COUNT(DISTINCT parent_id) as unique_parents,
-               GROUP_CONCAT(DISTINCT body_type)
-        FROM bodies
-        WHERE system_id = ?
-    """, (sys_id,))
-
-    count, unique_parents, body_types = c.fetchone()
+    count, unique_parents, body_types = system_stats.get(sys_id, (0, 0, None))
     print(f"  Total bodies in system: {count}")
     print(f"  Unique parent_id values: {unique_parents}")
     if body_types:
         print(f"  Body types: {body_types}")
 
     # List the bodies
-    c.execute("""
-        SELECT id, name, parent_id, body_type, spectral
-        FROM bodies
-        WHERE system_id = ?
-        ORDER BY parent_id, name
-    """, (sys_id,))
-
-    bodies = c.fetchall()
-    for body_id, body_name, parent_id, body_type, spectral in bodies:
+    for body_id, body_name, parent_id, body_type, spectral in system_bodies.get(sys_id, []):
         marker = "[STAR]" if spectral and spectral.strip() else ""
         print(f"    -> {body_name} (ID:{body_id}, Parent:{parent_id}, Type:{body_type}) {marker}")
 
@@ -53,19 +66,28 @@ for sys_id, name, x, y, z in empty_systems:
 # Summary of ALL system types
 print("\n\n=== SYSTEM CLASSIFICATION ===\n")
 
+# Aggregate child counts and star-bearing systems once instead of two
+# correlated subqueries per container row
 c.execute("""
+    WITH child_stats AS (
+        SELECT system_id, COUNT(*) AS n_children
+        FROM bodies
+        WHERE id != system_id
+        GROUP BY system_id
+    ),
+""" + STAR_SYSTEMS_CTE + """
     SELECT
         CASE
-            WHEN spectral != '' AND spectral IS NOT NULL THEN 'Single Star'
-            WHEN (SELECT COUNT(*) FROM bodies b2 WHERE b2.system_id = bodies.id AND b2.id != bodies.id AND b2.spectral != '' AND b2.spectral IS NOT NULL) > 0
-                THEN 'Multi-Star Container'
-            WHEN (SELECT COUNT(*) FROM bodies b2 WHERE b2.system_id = bodies.id AND b2.id != bodies.id) > 0
-                THEN 'Complex System'
+            WHEN b.spectral != '' AND b.spectral IS NOT NULL THEN 'Single Star'
+            WHEN ss.system_id IS NOT NULL THEN 'Multi-Star Container'
+            WHEN cs.n_children > 0 THEN 'Complex System'
             ELSE 'Empty/Unknown'
         END as system_type,
         COUNT(*) as count
-    FROM bodies
-    WHERE system_id = id AND parent_id = 0
+    FROM bodies b
+    LEFT JOIN child_stats cs ON cs.system_id = b.id
+    LEFT JOIN star_systems ss ON ss.system_id = b.id
+    WHERE b.system_id = b.id AND b.parent_id = 0
     GROUP BY system_type
     ORDER BY count DESC
 """)
@@ -1,33 +1,37 @@
 #!/usr/bin/env python3
-import sqlite3
+from astrodb import open_db, warn_missing_indexes
 
-conn = sqlite3.connect('TotalSystem.AstroDB')
+conn = open_db('TotalSystem.AstroDB')
+warn_missing_indexes(conn)
 c = conn.cursor()
 
 print("\n=== MULTI-STAR SYSTEM ANALYSIS ===\n")
 
+# Root-level components grouped by system, computed once and joined
+# instead of a correlated COUNT(*) per container row
+HAS_CHILDREN_CTE = """
+    WITH has_children AS (
+        SELECT system_id, COUNT(*) AS n_components
+        FROM bodies
+        WHERE parent_id = 0 AND id != system_id
+        GROUP BY system_id
+    )
+"""
+
 # Find containers (system_id = id, no spectral type, but has child components)
-c.execute("""
-    SELECT id, name, x, y, z
-    FROM bodies
-    WHERE system_id = id AND parent_id = 0 AND (spectral = '' OR spectral IS NULL)
-    AND (SELECT COUNT(*) FROM bodies b2
-         WHERE b2.system_id = bodies.id AND b2.parent_id = 0 AND b2.id != bodies.id) > 0
-    ORDER BY name
+c.execute(HAS_CHILDREN_CTE + """
+    SELECT b.id, b.name, b.x, b.y, b.z, hc.n_components
+    FROM bodies b
+    JOIN has_children hc ON hc.system_id = b.id
+    WHERE b.system_id = b.id AND b.parent_id = 0 AND (b.spectral = '' OR b.spectral IS NULL)
+    ORDER BY b.name
 """)
 
 multistar_systems = c.fetchall()
 count = 0
 
 for system in multistar_systems:
-    sys_id, name, x, y, z = system
-
-    # Count components
-    c.execute("""
-        SELECT COUNT(*) FROM bodies
-        WHERE system_id = ? AND parent_id = 0 AND id != ?
-    """, (sys_id, sys_id))
-    comp_count = c.fetchone()[0]
+    sys_id, name, x, y, z, comp_count = system
 
     print(f"Multi-Star Container: {name} (ID: {sys_id})")
     print(f"  Position: ({x}, {y}, {z})")
@@ -52,28 +56,19 @@ for system in multistar_systems:
         print("... (showing first 15 multi-star systems)")
         break
 
-# Summary statistics
-c.execute("""
-    SELECT COUNT(*) FROM bodies
-    WHERE system_id = id AND parent_id = 0 AND (spectral = '' OR spectral IS NULL)
-    AND (SELECT COUNT(*) FROM bodies b2
-         WHERE b2.system_id = bodies.id AND b2.parent_id = 0 AND b2.id != bodies.id) > 0
-""")
-total_multistar = c.fetchone()[0]
-
-c.execute("""
-    SELECT COUNT(*) FROM bodies
-    WHERE system_id = id AND parent_id = 0 AND spectral != '' AND spectral IS NOT NULL
-""")
-total_singlestar = c.fetchone()[0]
-
-c.execute("""
-    SELECT COUNT(*) FROM bodies
-    WHERE system_id = id AND parent_id = 0 AND (spectral = '' OR spectral IS NULL)
-    AND (SELECT COUNT(*) FROM bodies b2
-         WHERE b2.system_id = bodies.id AND b2.parent_id = 0 AND b2.id != bodies.id) = 0
+# Summary statistics in a single pass over the root bodies
+c.execute(HAS_CHILDREN_CTE + """
+    SELECT
+        SUM(CASE WHEN b.spectral != '' AND b.spectral IS NOT NULL THEN 1 ELSE 0 END),
+        SUM(CASE WHEN (b.spectral = '' OR b.spectral IS NULL) AND hc.system_id IS NOT NULL
+                 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN (b.spectral = '' OR b.spectral IS NULL) AND hc.system_id IS NULL
+                 THEN 1 ELSE 0 END)
+    FROM bodies b
+    LEFT JOIN has_children hc ON hc.system_id = b.id
+    WHERE b.system_id = b.id AND b.parent_id = 0
 """)
-total_empty = c.fetchone()[0]
+total_singlestar, total_multistar, total_empty = (n or 0 for n in c.fetchone())
 
 print("\n=== SUMMARY ===")
 print(f"Single-Star Systems: {total_singlestar}")
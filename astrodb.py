@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the AstroDB (Astrosynthesis SQLite) analysis scripts.
+
+Run directly to add the supporting indexes to a save file (one-time migration):
+    python astrodb.py [path/to/file.AstroDB]
+"""
+import sqlite3
+import sys
+
+DEFAULT_DB_PATH = 'TotalSystem.AstroDB'
+
+# Indexes backing the system_id / parent_id / spectral filters used by
+# analyze_empty_systems.py and analyze_multistar.py
+BODY_INDEXES = {
+    'ix_bodies_system_id': "CREATE INDEX IF NOT EXISTS ix_bodies_system_id ON bodies(system_id, parent_id)",
+    'ix_bodies_parent_id': "CREATE INDEX IF NOT EXISTS ix_bodies_parent_id ON bodies(parent_id)",
+    'ix_bodies_spectral': """
+        CREATE INDEX IF NOT EXISTS ix_bodies_spectral ON bodies(system_id)
+        WHERE spectral IS NOT NULL AND spectral != ''
+    """,
+}
+
+# Coordinate index for the bounding-box prefilter in visualize_amateru.py
+STAR_INDEXES = {
+    'ix_stars_xyz': "CREATE INDEX IF NOT EXISTS ix_stars_xyz ON stars(x, y, z)",
+}
+
+INDEXES = {
+    'bodies': BODY_INDEXES,
+    'stars': STAR_INDEXES,
+}
+
+# Systems with at least one spectral-bearing member other than the system
+# body itself. Served by ix_bodies_spectral and materialized once per query,
+# so "does this system contain stars?" is a join rather than a per-row scan.
+STAR_SYSTEMS_CTE = """
+    star_systems AS (
+        SELECT DISTINCT system_id
+        FROM bodies
+        WHERE spectral IS NOT NULL AND spectral != '' AND id != system_id
+    )
+"""
+
+def open_db(path=DEFAULT_DB_PATH):
+    """
+    Open an AstroDB file with a large page cache so repeated scans of
+    bodies stay in memory instead of re-reading the file. Only
+    connection-scoped pragmas are set; the file itself is left as-is.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        PRAGMA cache_size=-262144;     -- 256 MiB
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=1073741824;   -- 1 GiB
+    """)
+    return conn
+
+def missing_indexes(conn, table):
+    """Names of the migration's indexes on table not yet present in the database"""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)
+    )}
+    return [name for name in INDEXES[table] if name not in existing]
+
+def warn_missing_indexes(conn, table='bodies'):
+    """Print a hint when the migration has not been run on this database"""
+    missing = missing_indexes(conn, table)
+    if missing:
+        print(f"Note: missing indexes {', '.join(missing)}; "
+              "run 'python astrodb.py' once to create them")
+
+def create_indexes(conn, table):
+    """Create any missing indexes on table and refresh its planner statistics"""
+    missing = missing_indexes(conn, table)
+    if not missing:
+        return []
+
+    for name in missing:
+        conn.execute(INDEXES[table][name])
+    conn.execute(f"ANALYZE {table}")
+    conn.commit()
+    return missing
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH
+
+    conn = open_db(db_path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    created = []
+    for table in INDEXES:
+        if table in tables:
+            created.extend(create_indexes(conn, table))
+    conn.close()
+
+    if created:
+        print(f"Created indexes in {db_path}: {', '.join(created)}")
+    else:
+        print(f"All indexes already present in {db_path}")
+
+if __name__ == "__main__":
+    main()
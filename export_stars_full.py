@@ -2,53 +2,64 @@
 """
 Export all stars to CSV, including both single-star systems and multi-star components.
 """
-import sqlite3
+import csv
 
-conn = sqlite3.connect('TotalSystem.AstroDB')
-c = conn.cursor()
+from astrodb import open_db
+
+# The export only reads: forbid writes and run it as one explicit read
+# transaction
+conn = open_db('TotalSystem.AstroDB')
+conn.execute("PRAGMA query_only=1")
+conn.isolation_level = None
+conn.execute("BEGIN")
+
+CSV_HEADER = [
+    "Name", "Spectral Type", "Radius (Solar)", "Mass (Solar)", "Luminosity (Solar)",
+    "Temperature (K)", "Star X", "Star Y", "Star Z", "System Name", "System X", "System Y", "System Z",
+]
+
+# Create CSV output through a 1 MiB buffer; csv.writer handles quoting
+with open('stars_complete.csv', 'w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+    writer = csv.writer(f, lineterminator='\n')
 
-# Create CSV output
-with open('stars_complete.csv', 'w', encoding='utf-8') as f:
     # Write header
-    f.write("Name,Spectral Type,Radius (Solar),Mass (Solar),Luminosity (Solar),Temperature (K),Star X,Star Y,Star Z,System Name,System X,System Y,System Z\n")
+    writer.writerow(CSV_HEADER)
 
-    # Get single-star systems
-    c.execute("""
-        SELECT id, name, spectral, radius, mass, luminosity, temp, x, y, z
+    # Single-star systems followed by multi-star components, in one query.
+    # is_component and group_name only drive the ordering and the counts.
+    rows = conn.execute("""
+        SELECT 0 AS is_component, name AS group_name,
+               name, spectral, radius, mass, luminosity, temp, x, y, z,
+               '' AS sys_name, x AS sys_x, y AS sys_y, z AS sys_z
         FROM bodies
         WHERE system_id = id AND parent_id = 0 AND spectral != '' AND spectral IS NOT NULL
-        ORDER BY name
-    """)
 
-    single_stars = c.fetchall()
-    for body_id, name, spectral, radius, mass, lum, temp, x, y, z in single_stars:
-        # Escape quotes in names
-        name_escaped = name.replace('"', '""')
-        f.write(f'"{name_escaped}","{spectral}",{radius},{mass},{lum},{temp},{x},{y},{z},"",{x},{y},{z}\n')
+        UNION ALL
 
-    # Get multi-star component stars
-    c.execute("""
-        SELECT b.id, b.name, b.spectral, b.radius, b.mass, b.luminosity, b.temp,
-                b.x, b.y, b.z, c.name, c.x, c.y, c.z
+        SELECT 1, c.name,
+               b.name, b.spectral, b.radius, b.mass, b.luminosity, b.temp, b.x, b.y, b.z,
+               c.name, c.x, c.y, c.z
         FROM bodies b
         JOIN bodies c ON b.parent_id = c.id
         WHERE c.system_id = c.id AND c.parent_id = 0
         AND (c.spectral = '' OR c.spectral IS NULL)
         AND b.spectral != '' AND b.spectral IS NOT NULL
-        AND b.parent_id = c.id
-        ORDER BY c.name, b.name
+
+        ORDER BY is_component, group_name, name
     """)
 
-    multi_stars = c.fetchall()
-    for b_id, name, spectral, radius, mass, lum, temp, x, y, z, sys_name, sys_x, sys_y, sys_z in multi_stars:
-        # Escape quotes in names
-        name_escaped = name.replace('"', '""')
-        sys_name_escaped = sys_name.replace('"', '""')
-        f.write(f'"{name_escaped}","{spectral}",{radius},{mass},{lum},{temp},{x},{y},{z},"{sys_name_escaped}",{sys_x},{sys_y},{sys_z}\n')
+    # Stream rows straight from the cursor instead of fetching them all
+    counts = [0, 0]
+    for row in rows:
+        counts[row[0]] += 1
+        writer.writerow(row[2:])
+
+conn.execute("COMMIT")
 
-print(f"Exported {len(single_stars)} single-star systems")
-print(f"Exported {len(multi_stars)} multi-star components")
-print(f"Total: {len(single_stars) + len(multi_stars)} stars")
+single_count, multi_count = counts
+print(f"Exported {single_count} single-star systems")
+print(f"Exported {multi_count} multi-star components")
+print(f"Total: {single_count + multi_count} stars")
 print("\nCSV saved to: stars_complete.csv")
 
 conn.close()
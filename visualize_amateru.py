@@ -3,12 +3,36 @@
 2D Star Map Visualization - Amateru Region
 Renders stars within 20 ly of Amateru as a 5000x5000 PNG
 with lines between stars closer than 10 ly apart.
+
+Requires NumPy and Pillow. SciPy (k-d tree pair lookup) and Numba
+(compiled overlap relaxation) are optional speedups.
 """
 
-import sqlite3
+import functools
 import math
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from astrodb import open_db, warn_missing_indexes
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # SciPy is optional; resolve_overlaps falls back to a grid for pair lookup
+    cKDTree = None
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    # Numba is optional; without it the kernels below run as plain Python
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
 # Configuration
 OUTPUT_WIDTH = 5000
 OUTPUT_HEIGHT = 5000
@@ -23,12 +47,12 @@ REGION_RADIUS_LY = 20.0  # Radius around Amateru
 
 def get_stars_near_amateru(db_path):
     """Get Amateru and all stars within REGION_RADIUS_LY"""
-    conn = sqlite3.connect(db_path)
+    conn = open_db(db_path)
     c = conn.cursor()
 
-    # Get Amateru
+    # Get Amateru (same columns as the nearby-star query below)
     c.execute("""
-        SELECT id, name, x, y, z, spectral
+        SELECT id, name, x, y, z, spectral, radius_solar, mass_solar, luminosity_solar
         FROM stars WHERE name = 'Amateru'
         LIMIT 1
     """)
@@ -36,8 +60,8 @@ def get_stars_near_amateru(db_path):
     if not result:
         # Try with different case
         c.execute("""
-            SELECT id, name, x, y, z, spectral
-            FROM (SELECT id, name, x, y, z, spectral FROM stars)
+            SELECT id, name, x, y, z, spectral, radius_solar, mass_solar, luminosity_solar
+            FROM stars
             WHERE LOWER(name) = 'amateru'
             LIMIT 1
         """)
@@ -52,36 +76,41 @@ def get_stars_near_amateru(db_path):
         conn.close()
         return None, []
 
-    amateru_id, amateru_name, ax, ay, az, aspec = result
+    amateru_id, amateru_name, ax, ay, az, aspec = result[:6]
     print(f"Found Amateru: {amateru_name} at ({ax}, {ay}, {az})")
     print(f"  Spectral: {aspec}")
 
-    # Get all stars and calculate distances
-    c.execute("""
-        SELECT id, name, x, y, z, spectral, radius_solar, mass_solar, luminosity_solar
-        FROM stars
-        ORDER BY name
-    """)
+    # The bounding-box prefilter below is a range scan once ix_stars_xyz exists
+    warn_missing_indexes(conn, 'stars')
 
-    all_stars = c.fetchall()
-    nearby_stars = [result]  # Include Amateru
-
-    for star in all_stars:
-        star_id, name, x, y, z, spec, radius, mass, lum = star
-        if star_id == amateru_id:
-            continue
+    # Let SQLite do all the filtering: the cube enclosing the search sphere
+    # narrows the scan via the index, then the exact squared distance is
+    # computed inline and only stars inside the sphere come back, nearest first
+    r = REGION_RADIUS_LY
+    c.execute("""
+        SELECT id, name, x, y, z, spectral, radius_solar, mass_solar, luminosity_solar, dist_sq
+        FROM (
+            SELECT id, name, x, y, z, spectral, radius_solar, mass_solar, luminosity_solar,
+                   (x - :ax) * (x - :ax) + (y - :ay) * (y - :ay) + (z - :az) * (z - :az) AS dist_sq
+            FROM stars
+            WHERE x BETWEEN :ax - :r AND :ax + :r
+              AND y BETWEEN :ay - :r AND :ay + :r
+              AND z BETWEEN :az - :r AND :az + :r
+              AND id != :amateru_id
+        )
+        WHERE dist_sq <= :r * :r
+        ORDER BY dist_sq
+    """, {'ax': ax, 'ay': ay, 'az': az, 'r': r, 'amateru_id': amateru_id})
 
-        # Calculate 3D distance
-        dist = math.sqrt((x - ax)**2 + (y - ay)**2 + (z - az)**2)
-        if dist <= REGION_RADIUS_LY:
-            nearby_stars.append(star)
+    # Each star carries its distance from Amateru (ly) as a trailing column
+    nearby_stars = [result + (0.0,)]  # Include Amateru
+    nearby_stars.extend(row[:-1] + (math.sqrt(row[-1]),) for row in c.fetchall())
 
     conn.close()
 
     print(f"\nFound {len(nearby_stars)} stars within {REGION_RADIUS_LY} ly of Amateru:")
     for star in nearby_stars[:10]:
-        _, name, x, y, z, spec, _, _, _ = star
-        dist = math.sqrt((x - ax)**2 + (y - ay)**2 + (z - az)**2)
+        _, name, x, y, z, spec, _, _, _, dist = star
         print(f"  {name:20} {spec:6} at distance {dist:6.2f} ly")
     if len(nearby_stars) > 10:
         print(f"  ... and {len(nearby_stars) - 10} more")
@@ -89,50 +118,40 @@ def get_stars_near_amateru(db_path):
     return (amateru_id, amateru_name, ax, ay, az), nearby_stars
 
 def calculate_distances(amateru, stars):
-    """Calculate 3D distances between all pairs of stars"""
-    ax, ay, az = amateru[2], amateru[3], amateru[4]
-    distances = {}
-
-    for i, star1 in enumerate(stars):
-        for j, star2 in enumerate(stars):
-            if i >= j:
-                continue
-
-            x1, y1, z1 = star1[2], star1[3], star1[4]
-            x2, y2, z2 = star2[2], star2[3], star2[4]
-
-            dist = math.sqrt((x2 - x1)**2 + (y2 - y1)**2 + (z2 - z1)**2)
-            distances[(i, j)] = dist
+    """
+    Calculate squared 3D distances between all pairs of stars as a dense
+    (N, N) matrix. Squared values are enough for threshold checks, so no
+    sqrt is taken.
+    """
+    if not stars:
+        return np.zeros((0, 0))
 
-    return distances
+    # Stack positions into an (N, 3) array and compute the full pairwise
+    # squared distance matrix in one vectorized pass
+    pts = np.array([(s[2], s[3], s[4]) for s in stars], dtype=np.float64)
+    diff = pts[:, None, :] - pts[None, :, :]
+    return (diff * diff).sum(axis=-1)
 
 def project_to_2d(stars):
     """
     Project 3D star positions to 2D using simple orthographic projection.
     Find bounding box and scale to fit the output image.
+    Returns an (N, 2) array of pixel coordinates.
     """
     if not stars:
-        return []
+        return np.zeros((0, 2))
 
     # Extract 2D coordinates (X and Y, drop Z)
-    positions_2d = [(s[2], s[3]) for s in stars]
+    xy = np.fromiter(
+        (c for s in stars for c in (s[2], s[3])), dtype=np.float64, count=2 * len(stars)
+    ).reshape(-1, 2)
 
-    # Calculate bounds
-    min_x = min(p[0] for p in positions_2d)
-    max_x = max(p[0] for p in positions_2d)
-    min_y = min(p[1] for p in positions_2d)
-    max_y = max(p[1] for p in positions_2d)
-
-    range_x = max_x - min_x
-    range_y = max_y - min_y
-
-    # Add 10% padding
+    # Calculate bounds, adding 10% padding to the range
+    lo = xy.min(axis=0)
+    hi = xy.max(axis=0)
     padding = 0.1
-    range_x *= (1 + padding)
-    range_y *= (1 + padding)
-
-    center_x = (min_x + max_x) / 2
-    center_y = (min_y + max_y) / 2
+    range_x, range_y = ((hi - lo) * (1 + padding)).tolist()
+    center = (lo + hi) / 2
 
     # Scale to output dimensions (leave margin for stars and labels)
     margin = 300
@@ -145,82 +164,181 @@ def project_to_2d(stars):
         scale = 1.0
 
     # Convert to pixel coordinates
-    pixel_positions = []
-    for pos in positions_2d:
-        px = (pos[0] - center_x) * scale + OUTPUT_WIDTH / 2
-        py = (pos[1] - center_y) * scale + OUTPUT_HEIGHT / 2
-        pixel_positions.append((px, py))
+    return (xy - center) * scale + np.array([OUTPUT_WIDTH, OUTPUT_HEIGHT]) / 2
 
-    return pixel_positions
+def _neighbour_pairs(positions, cell_size):
+    """
+    Candidate (i, j) pairs with i < j whose stars sit in the same or
+    adjacent cells of a grid with the given cell size. Used instead of the
+    k-d tree when SciPy is not installed.
+    """
+    grid = {}
+    for i, (x, y) in enumerate(positions.tolist()):
+        grid.setdefault((int(x // cell_size), int(y // cell_size)), []).append(i)
+
+    pairs = []
+    for (cx, cy), cell in grid.items():
+        neighbours = sorted(
+            j
+            for nx in (cx - 1, cx, cx + 1)
+            for ny in (cy - 1, cy, cy + 1)
+            for j in grid.get((nx, ny), ())
+        )
+        pairs.extend((i, j) for i in cell for j in neighbours if j > i)
+
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+@njit(cache=True)
+def _push_apart(xs, ys, pair_i, pair_j, min_distance):
+    """
+    One relaxation pass over all pairs (i < j) in order, updating the xs/ys
+    coordinates in place. Returns True if any star was moved.
+
+    (pair_i, pair_j) must be sorted and contain every pair that overlapped
+    when the pass started. A pair whose stars have both stayed put so far
+    can only overlap if it is listed, so only listed pairs and pairs
+    touching an already-moved star are tested.
+    """
+    n = len(xs)
+    n_pairs = len(pair_i)
+    min_distance_sq = min_distance * min_distance
+    star_moved = [False] * n
+    moved = False
+    k = 0
+
+    for i in range(n):
+        j = i + 1
+        while j < n:
+            listed_j = pair_j[k] if k < n_pairs and pair_i[k] == i else n
+
+            if not star_moved[i]:
+                # Skip ahead to the next listed partner or already-moved star
+                while j < listed_j and not star_moved[j]:
+                    j += 1
+                if j == n:
+                    break
+
+            if j == listed_j:
+                k += 1
+
+            dx = xs[j] - xs[i]
+            dy = ys[j] - ys[i]
+            dist_sq = dx * dx + dy * dy
+
+            if dist_sq < min_distance_sq and dist_sq > 0:
+                # Push stars apart
+                dist = math.sqrt(dist_sq)
+                force = (min_distance - dist) / 2
+                norm_x = dx / dist
+                norm_y = dy / dist
+
+                xs[i] -= norm_x * force
+                ys[i] -= norm_y * force
+                xs[j] += norm_x * force
+                ys[j] += norm_y * force
+
+                star_moved[i] = True
+                star_moved[j] = True
+                moved = True
+
+            j += 1
+
+    return moved
 
 def resolve_overlaps(pixel_positions, min_distance=150):
     """
     Resolve overlapping stars by applying simple repulsive forces.
     Iteratively push stars apart if they're too close.
+
+    Each pass a k-d tree (or a grid when SciPy is missing) lists the pairs
+    that overlap at the start of the pass, so well-separated maps return
+    after a single query. Pairs are still relaxed in the original (i, j)
+    order, and stars moved during a pass are re-checked against every later
+    star, so the result matches a full pairwise sweep. The pair loop itself
+    is compiled with Numba when it is installed.
     """
-    positions = [list(p) for p in pixel_positions]
+    positions = np.array(pixel_positions, dtype=np.float64).reshape(-1, 2)
+
+    # The kernel indexes scalars: contiguous arrays when compiled, plain
+    # lists (much faster to index from Python) when it is not
+    xs = positions[:, 0].tolist()
+    ys = positions[:, 1].tolist()
+    if HAVE_NUMBA:
+        xs, ys = np.array(xs), np.array(ys)
 
     max_iterations = 50
     for iteration in range(max_iterations):
-        moved = False
-
-        for i in range(len(positions)):
-            for j in range(i + 1, len(positions)):
-                dx = positions[j][0] - positions[i][0]
-                dy = positions[j][1] - positions[i][1]
-                dist = math.sqrt(dx**2 + dy**2)
-
-                if dist < min_distance and dist > 0:
-                    # Push stars apart
-                    force = (min_distance - dist) / 2
-                    norm_x = dx / dist
-                    norm_y = dy / dist
-
-                    positions[i][0] -= norm_x * force
-                    positions[i][1] -= norm_y * force
-                    positions[j][0] += norm_x * force
-                    positions[j][1] += norm_y * force
+        points = np.column_stack((xs, ys)).reshape(-1, 2)
+        if cKDTree is not None:
+            pairs = cKDTree(points).query_pairs(min_distance, output_type='ndarray')
+        else:
+            pairs = _neighbour_pairs(points, min_distance)
+        if len(pairs) == 0:
+            break
 
-                    moved = True
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))].astype(np.int64)
+        pair_i, pair_j = np.ascontiguousarray(pairs[:, 0]), np.ascontiguousarray(pairs[:, 1])
+        if not HAVE_NUMBA:
+            pair_i, pair_j = pair_i.tolist(), pair_j.tolist()
 
-        if not moved:
+        if not _push_apart(xs, ys, pair_i, pair_j, float(min_distance)):
             break
 
-    return [(float(p[0]), float(p[1])) for p in positions]
+    return [(float(x), float(y)) for x, y in zip(xs, ys)]
 
-def render_map(amateru, nearby_stars, distances, pixel_positions):
+@functools.lru_cache(maxsize=8)
+def _font(size):
+    """Load Arial at the given size once, falling back to Pillow's default font"""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=None)
+def _star_sprite(radius):
+    """
+    Pre-rendered star disk of the given integer radius, pasted with its own
+    alpha as the mask so every star of that size shares one rasterization.
+    """
+    size = 2 * radius + 1
+    sprite = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).ellipse(
+        [0, 0, size - 1, size - 1],
+        fill=STAR_COLOR + (255,), outline=TEXT_COLOR + (255,), width=2
+    )
+    return sprite
+
+def render_map(amateru, nearby_stars, distances_sq, pixel_positions):
     """Render the star map to PNG"""
     # Create image
     img = Image.new('RGB', (OUTPUT_WIDTH, OUTPUT_HEIGHT), BACKGROUND_COLOR)
     draw = ImageDraw.Draw(img)
 
     ax_id = amateru[0]
+    close_distance_sq = CLOSE_DISTANCE_LY ** 2
 
-    # Draw lines between nearby stars (< 10 ly)
-    for (i, j), dist_ly in distances.items():
-        if dist_ly < CLOSE_DISTANCE_LY:
-            x1, y1 = pixel_positions[i]
-            x2, y2 = pixel_positions[j]
+    # Pairs (i < j) of nearby stars (< 10 ly)
+    i_idx, j_idx = np.where(np.triu(distances_sq < close_distance_sq, k=1))
 
-            # Vary line width based on distance
-            if dist_ly < 5:
-                width = 5
-            elif dist_ly < 8:
-                width = 4
-            else:
-                width = 3
+    # Vary line width based on distance (5 ly and 8 ly, squared)
+    widths = np.array([5, 4, 3])[np.digitize(distances_sq[i_idx, j_idx], [25, 64])]
 
-            draw.line([(x1, y1), (x2, y2)], fill=LINE_COLOR, width=width)
+    # Gather both endpoints of every line from the pixel positions
+    pixel_xy = np.asarray(pixel_positions, dtype=np.float32).reshape(-1, 2)
+    p1 = pixel_xy[i_idx].tolist()
+    p2 = pixel_xy[j_idx].tolist()
 
-    # Draw stars
-    for i, star in enumerate(nearby_stars):
-        star_id, name, x, y, z, spec, radius, mass, lum = star
-        px, py = pixel_positions[i]
+    # Draw lines between nearby stars
+    for (x1, y1), (x2, y2), width in zip(p1, p2, widths.tolist()):
+        draw.line([(x1, y1), (x2, y2)], fill=LINE_COLOR, width=width)
+
+    # Vary size by luminosity (cube root to make differences visible, capped at 3x)
+    lum_arr = np.array([s[8] if s[8] and s[8] > 0 else 1.0 for s in nearby_stars])
+    radii = (np.minimum(np.cbrt(lum_arr), 3.0) * STAR_RADIUS).astype(int)
 
-        # Vary size by luminosity (cube root to make differences visible)
-        size_factor = (lum ** (1/3)) if lum > 0 else 1.0
-        size_factor = min(size_factor, 3.0)  # Cap at 3x
-        radius = STAR_RADIUS * size_factor
+    # Draw stars
+    for star, (px, py), radius in zip(nearby_stars, pixel_positions, radii.tolist()):
+        star_id = star[0]
 
         # Highlight Amateru
         if star_id == ax_id:
@@ -232,22 +350,15 @@ def render_map(amateru, nearby_stars, distances, pixel_positions):
             )
 
         # Draw star
-        draw.ellipse(
-            [px - radius, py - radius, px + radius, py + radius],
-            fill=STAR_COLOR, outline=TEXT_COLOR, width=2
-        )
+        sprite = _star_sprite(radius)
+        img.paste(sprite, (int(round(px)) - radius, int(round(py)) - radius), sprite)
 
-    # Try to load a font, fall back to default
-    try:
-        font = ImageFont.truetype("arial.ttf", 40)
-        small_font = ImageFont.truetype("arial.ttf", 30)
-    except:
-        font = ImageFont.load_default()
-        small_font = font
+    font = _font(40)
+    small_font = _font(30)
 
     # Draw star names
     for i, star in enumerate(nearby_stars):
-        star_id, name, x, y, z, spec, radius, mass, lum = star
+        star_id, name, x, y, z, spec, radius, mass, lum, dist = star
         px, py = pixel_positions[i]
 
         # Offset text below star
@@ -263,7 +374,7 @@ def render_map(amateru, nearby_stars, distances, pixel_positions):
             draw.text((px - 80, text_y + 50), spec, fill=text_color, font=small_font)
         else:
             draw.text((px - 100, text_y), name, fill=TEXT_COLOR, font=small_font)
-            draw.text((px - 80, text_y + 40), spec, fill=TEXT_COLOR, font=small_font)
+            draw.text((px - 80, text_y + 40), f"{spec}  {dist:.1f} ly", fill=TEXT_COLOR, font=small_font)
 
     # Draw title and info
     title = f"Stars Near Amateru (within {REGION_RADIUS_LY} ly)"
@@ -278,7 +389,7 @@ def render_map(amateru, nearby_stars, distances, pixel_positions):
     print(f"\nMap saved to: {output_path}")
     print(f"Image size: {OUTPUT_WIDTH}x{OUTPUT_HEIGHT}")
     print(f"Stars rendered: {len(nearby_stars)}")
-    print(f"Connections drawn: {len([(d for d in distances.values() if d < CLOSE_DISTANCE_LY)])}")
+    print(f"Connections drawn: {len(i_idx)}")
 
 def main():
     db_path = "TotalSystem.AstroDB"
@@ -291,8 +402,8 @@ def main():
     if not amateru:
         return
 
-    # Calculate distances
-    distances = calculate_distances(amateru, nearby_stars)
+    # Calculate squared distances
+    distances_sq = calculate_distances(amateru, nearby_stars)
 
     # Project to 2D
     print(f"\nProjecting {len(nearby_stars)} stars to 2D...")
@@ -304,7 +415,7 @@ def main():
 
     # Render
     print("Rendering map...")
-    render_map(amateru, nearby_stars, distances, pixel_positions)
+    render_map(amateru, nearby_stars, distances_sq, pixel_positions)
 
 if __name__ == "__main__":
     main()